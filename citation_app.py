@@ -4,68 +4,210 @@ Uses Wikipedia's Citoid API to fetch citation metadata for any URL
 """
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from urllib3.util.retry import Retry
 from urllib.parse import quote
-import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import orjson
+import ijson
 import os
-from dotenv import load_dotenv
-import re
+
+
+@st.cache_resource(show_spinner=False)
+def _load_env():
+    """Load environment variables from .env once per process"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return True
+
 
 # Load environment variables
-load_dotenv()
+_load_env()
 
+# Sent with every request through the shared session
+_CITOID_HEADERS = {"User-Agent": "Streamlit-Citation-Fetcher/1.0 (Educational Project)"}
 
-def fetch_citation(url, format_type="zotero"):
+# Inputs starting with these prefixes are sent to the Zotero /web endpoint
+_URL_PREFIXES = ("http://", "https://")
+
+# Number of recent successful results kept per session for the stale fallback
+_FRESH_RESULTS_MAX = 32
+_FRESH_RESULTS_LOCK = threading.Lock()
+
+# Citoid responses larger than this (in bytes) are parsed incrementally with ijson
+_STREAM_PARSE_THRESHOLD = 64 * 1024
+
+
+@st.cache_resource
+def _get_session():
     """
-    Fetch citation metadata from Citoid API
+    Build a shared HTTP session so repeated fetches reuse pooled connections
+
+    Returns:
+        requests.Session: Session with keep-alive pooling and retries on transient errors
+    """
+    session = requests.Session()
+    session.headers.update(_CITOID_HEADERS)
+    # Retry rate limits and transient gateway errors on the kept-alive connection,
+    # honouring Retry-After so Wikimedia's rate limiter isn't hammered.
+    # Read errors are not retried: a slow scrape or translation would otherwise
+    # be re-sent (and re-queued on the Zotero server) on every attempt. read=False
+    # re-raises the original error, so requests still reports a ReadTimeout
+    retries = Retry(
+        total=3,
+        connect=1,
+        read=False,
+        backoff_factor=0.3,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def _fetch_citoid_raw(url, format_type):
+    """
+    Call the Citoid API and cache successful responses
+
+    Errors are raised rather than returned so that failed calls are never cached.
 
     Args:
         url: The URL to fetch citation data for
         format_type: Citation format (mediawiki, mediawiki-basefields, zotero, bibtex)
 
     Returns:
-        dict: Response from the API or error details
+        dict: Parsed response data and request details
     """
-    try:
-        # Encode the URL
-        encoded_url = quote(url, safe="")
-
-        # Build the API endpoint
-        api_url = f"https://en.wikipedia.org/api/rest_v1/data/citation/{format_type}/{encoded_url}"
+    # Encode the URL
+    encoded_url = quote(url, safe="")
 
-        # Set headers with User-Agent
-        headers = {"User-Agent": "Streamlit-Citation-Fetcher/1.0 (Educational Project)"}
+    # Build the API endpoint
+    api_url = f"https://en.wikipedia.org/api/rest_v1/data/citation/{format_type}/{encoded_url}"
 
-        # Make the API call
-        response = requests.get(api_url, headers=headers, timeout=10)
+    # Make the API call (the shared session carries the User-Agent header)
+    # Stream the body so large JSON payloads can be parsed incrementally
+    response = _get_session().get(api_url, timeout=10, stream=True)
 
+    try:
         # Raise exception for bad status codes
         response.raise_for_status()
 
         # Parse response based on format type
         # BibTeX returns plain text, others return JSON
         if format_type == "bibtex":
-            data = response.text
+            # Decode as UTF-8 directly to skip requests' charset detection
+            data = response.content.decode("utf-8", errors="replace")
             is_json = False
+        elif int(response.headers.get("content-length", 0)) > _STREAM_PARSE_THRESHOLD:
+            # Citoid returns a top-level array, so decode it record by record
+            # Reading response.raw bypasses requests' exception wrapping, so map
+            # urllib3 read errors back to the requests exceptions handled by callers
+            response.raw.decode_content = True
+            try:
+                data = list(ijson.items(response.raw, "item", use_float=True))
+            except ReadTimeoutError as e:
+                raise requests.exceptions.Timeout(e, response=response)
+            except ProtocolError as e:
+                raise requests.exceptions.ConnectionError(e, response=response)
+            is_json = True
         else:
-            data = response.json()
+            data = orjson.loads(response.content)
             is_json = True
+    finally:
+        response.close()
+
+    return {
+        "success": True,
+        "data": data,
+        # Download payload is built once here and cached with the response
+        "download": orjson.dumps(data, option=orjson.OPT_INDENT_2) if is_json else data,
+        "is_json": is_json,
+        "format_type": format_type,
+        "api_url": api_url,
+    }
+
+
+def _fresh_key(source, *parts):
+    """Key under which the last successful result is kept"""
+    return "::".join((source, *parts))
+
+
+def _remember_result(key, result):
+    """
+    Keep a successful result for the stale fallback, dropping the oldest beyond the limit
+
+    The download bytes are left out and rebuilt only if the result is served stale.
+
+    Args:
+        key: Key from _fresh_key
+        result: Successful result dict
+    """
+    # Comparison mode calls this from two worker threads at once
+    with _FRESH_RESULTS_LOCK:
+        fresh = st.session_state.setdefault("_fresh_results", OrderedDict())
+        fresh[key] = {k: v for k, v in result.items() if k != "download"}
+        fresh.move_to_end(key)
+        while len(fresh) > _FRESH_RESULTS_MAX:
+            fresh.popitem(last=False)
 
-        return {
-            "success": True,
-            "data": data,
-            "is_json": is_json,
-            "format_type": format_type,
-            "api_url": api_url,
-        }
+
+def _stale_or_error(key, error):
+    """
+    Fall back to the last successful result when the upstream API is unreachable
+
+    Args:
+        key: Key of the last successful result
+        error: Error message to return if there is no stored result
+
+    Returns:
+        dict: The stored result flagged as stale, or error details
+    """
+    stale = st.session_state.get("_fresh_results", {}).get(key)
+    if not stale:
+        return {"success": False, "error": error}
+
+    # Zotero results are always JSON and carry no is_json flag
+    if stale.get("is_json", True):
+        download = orjson.dumps(stale["data"], option=orjson.OPT_INDENT_2)
+    else:
+        download = stale["data"]
+    return {**stale, "download": download, "stale": True}
+
+
+def fetch_citation(url, format_type="zotero"):
+    """
+    Fetch citation metadata from Citoid API
+
+    Args:
+        url: The URL to fetch citation data for
+        format_type: Citation format (mediawiki, mediawiki-basefields, zotero, bibtex)
+
+    Returns:
+        dict: Response from the API or error details
+    """
+    fresh_key = _fresh_key("citoid", url, format_type)
+    try:
+        result = _fetch_citoid_raw(url, format_type)
+        _remember_result(fresh_key, result)
+        return result
 
     except requests.exceptions.ConnectionError:
-        return {
-            "success": False,
-            "error": "Connection error. Please check your internet connection.",
-        }
+        return _stale_or_error(
+            fresh_key, "Connection error. Please check your internet connection."
+        )
     except requests.exceptions.Timeout:
-        return {"success": False, "error": "Request timed out. Please try again."}
+        return _stale_or_error(fresh_key, "Request timed out. Please try again.")
     except requests.exceptions.HTTPError as e:
         return {
             "success": False,
@@ -85,20 +227,68 @@ def is_doi_or_identifier(text):
     Returns:
         bool: True if it looks like a DOI/identifier, False if it's a URL
     """
-    # DOI pattern: starts with 10. followed by numbers/dots/text
-    doi_pattern = r'^10\.\d{4,}/[^\s]+$'
-
     # If it starts with http:// or https://, it's a URL
-    if text.strip().startswith(('http://', 'https://')):
-        return False
+    # Anything else (DOI, PMID, ISBN, etc.) is treated as an identifier
+    return not text.strip().startswith(_URL_PREFIXES)
+
+
+@st.cache_resource
+def _zotero_creds():
+    """
+    Resolve Zotero Translator Server credentials once per process
+
+    Returns:
+        tuple: (web endpoint, search endpoint, API key), all None if not configured
+    """
+    # Get credentials from Streamlit secrets (Cloud) or environment variables (local)
+    # Streamlit secrets take precedence
+    try:
+        api_url = st.secrets["zotero"]["api_url"]
+        api_key = st.secrets["zotero"]["api_key"]
+    except (KeyError, FileNotFoundError):
+        # Fall back to environment variables for local development
+        api_url = os.getenv('ZOTERO_API_URL')
+        api_key = os.getenv('ZOTERO_API_KEY')
+
+    if not api_url or not api_key:
+        return None, None, None
+
+    endpoint_base = api_url.rstrip('/')
+    return f"{endpoint_base}/web", f"{endpoint_base}/search", api_key
 
-    # If it matches DOI pattern, it's an identifier
-    if re.match(doi_pattern, text.strip()):
-        return True
 
-    # Other identifiers like PMID, ISBN, etc. would go here
-    # For now, treat anything without http(s) as an identifier
-    return not text.strip().startswith(('http://', 'https://'))
+@st.cache_data(ttl=30, max_entries=512, show_spinner=False)
+def _fetch_zotero_raw(endpoint, input_text, _api_key):
+    """
+    Call the Zotero Translator Server and cache successful responses
+
+    The API key is prefixed with an underscore so Streamlit leaves it out of
+    the cache key. Errors are raised rather than returned so that failed calls
+    are never cached.
+
+    Args:
+        endpoint: Full /web or /search endpoint URL
+        input_text: URL or identifier to send as the request body
+        _api_key: API key for the x-api-key header
+
+    Returns:
+        tuple: Parsed JSON response and its indented JSON bytes for download
+    """
+    # Set headers
+    headers = {
+        "x-api-key": _api_key,
+        "Content-Type": "text/plain"
+    }
+
+    # Make the API call
+    response = _get_session().post(endpoint, headers=headers, data=input_text, timeout=10)
+
+    # Raise exception for bad status codes
+    response.raise_for_status()
+
+    # Parse JSON response and build the download payload once, alongside it in the cache
+    data = orjson.loads(response.content)
+    return data, orjson.dumps(data, option=orjson.OPT_INDENT_2)
 
 
 def fetch_zotero_citation(input_text):
@@ -111,18 +301,11 @@ def fetch_zotero_citation(input_text):
     Returns:
         dict: Response from the API or error details
     """
+    fresh_key = _fresh_key("zotero", input_text)
     try:
-        # Get credentials from Streamlit secrets (Cloud) or environment variables (local)
-        # Streamlit secrets take precedence
-        try:
-            api_url = st.secrets["zotero"]["api_url"]
-            api_key = st.secrets["zotero"]["api_key"]
-        except (KeyError, FileNotFoundError):
-            # Fall back to environment variables for local development
-            api_url = os.getenv('ZOTERO_API_URL')
-            api_key = os.getenv('ZOTERO_API_KEY')
-
-        if not api_url or not api_key:
+        web_endpoint, search_endpoint, api_key = _zotero_creds()
+
+        if not web_endpoint or not api_key:
             return {
                 "success": False,
                 "error": "Zotero API credentials not configured. Please set credentials in .streamlit/secrets.toml (Cloud) or .env file (local).",
@@ -130,41 +313,30 @@ def fetch_zotero_citation(input_text):
 
         # Determine which endpoint to use
         if is_doi_or_identifier(input_text):
-            endpoint = f"{api_url.rstrip('/')}/search"
+            endpoint = search_endpoint
             endpoint_type = "search"
         else:
-            endpoint = f"{api_url.rstrip('/')}/web"
+            endpoint = web_endpoint
             endpoint_type = "web"
 
-        # Set headers
-        headers = {
-            "x-api-key": api_key,
-            "Content-Type": "text/plain"
-        }
-
-        # Make the API call
-        response = requests.post(endpoint, headers=headers, data=input_text, timeout=10)
-
-        # Raise exception for bad status codes
-        response.raise_for_status()
-
-        # Parse JSON response
-        data = response.json()
+        data, download = _fetch_zotero_raw(endpoint, input_text, api_key)
 
-        return {
+        result = {
             "success": True,
             "data": data,
+            "download": download,
             "endpoint_type": endpoint_type,
             "api_url": endpoint,
         }
+        _remember_result(fresh_key, result)
+        return result
 
     except requests.exceptions.ConnectionError:
-        return {
-            "success": False,
-            "error": "Connection error. Please check your internet connection.",
-        }
+        return _stale_or_error(
+            fresh_key, "Connection error. Please check your internet connection."
+        )
     except requests.exceptions.Timeout:
-        return {"success": False, "error": "Request timed out. Please try again."}
+        return _stale_or_error(fresh_key, "Request timed out. Please try again.")
     except requests.exceptions.HTTPError as e:
         error_detail = e.response.text if hasattr(e.response, 'text') else str(e)
         return {
@@ -229,32 +401,48 @@ def main():
             help="Choose the citation format to retrieve",
         )
 
+    # Cache controls
+    if st.button("♻️ Clear cache", help="Discard cached API responses and fetch fresh data"):
+        _fetch_citoid_raw.clear()
+        _fetch_zotero_raw.clear()
+        st.toast("Cache cleared")
+
     # Fetch button
     if st.button("🔍 Fetch Citation", type="primary"):
         if not url_input:
             st.warning("⚠️ Please enter a URL or DOI")
         else:
             if comparison_mode:
-                # Comparison mode: fetch from both APIs
+                # Comparison mode: fetch from both APIs concurrently
+                # Worker threads inherit the script context so Streamlit caching works there
+                ctx = get_script_run_ctx()
+                with st.spinner("Fetching both APIs..."):
+                    with ThreadPoolExecutor(
+                        max_workers=2, initializer=add_script_run_ctx, initargs=(None, ctx)
+                    ) as executor:
+                        citoid_future = executor.submit(fetch_citation, url_input, format_type)
+                        zotero_future = executor.submit(fetch_zotero_citation, url_input)
+                        citoid_result = citoid_future.result()
+                        zotero_result = zotero_future.result()
+
                 st.markdown("---")
                 col_left, col_right = st.columns(2)
 
                 with col_left:
                     st.subheader("🌐 Citoid API")
-                    with st.spinner("Fetching from Citoid..."):
-                        citoid_result = fetch_citation(url_input, format_type)
 
                     if citoid_result["success"]:
                         st.success("✅ Success")
+                        if citoid_result.get("stale"):
+                            st.warning("⚠️ Showing cached result — upstream unreachable")
                         with st.expander("🔗 API Request Details"):
                             st.code(citoid_result["api_url"], language="text")
 
                         if citoid_result["is_json"]:
                             st.json(citoid_result["data"])
-                            json_str = json.dumps(citoid_result["data"], indent=2)
                             st.download_button(
                                 label="📥 Download JSON",
-                                data=json_str,
+                                data=citoid_result["download"],
                                 file_name=f"citoid_{citoid_result['format_type']}.json",
                                 mime="application/json",
                                 key="citoid_download"
@@ -273,19 +461,18 @@ def main():
 
                 with col_right:
                     st.subheader("⚡ Zotero Translator Server")
-                    with st.spinner("Fetching from Zotero..."):
-                        zotero_result = fetch_zotero_citation(url_input)
 
                     if zotero_result["success"]:
                         st.success(f"✅ Success (via /{zotero_result['endpoint_type']})")
+                        if zotero_result.get("stale"):
+                            st.warning("⚠️ Showing cached result — upstream unreachable")
                         with st.expander("🔗 API Request Details"):
                             st.code(zotero_result["api_url"], language="text")
 
                         st.json(zotero_result["data"])
-                        json_str = json.dumps(zotero_result["data"], indent=2)
                         st.download_button(
                             label="📥 Download JSON",
-                            data=json_str,
+                            data=zotero_result["download"],
                             file_name="zotero_citation.json",
                             mime="application/json",
                             key="zotero_download"
@@ -300,6 +487,8 @@ def main():
 
                 if result["success"]:
                     st.success("✅ Citation metadata retrieved successfully!")
+                    if result.get("stale"):
+                        st.warning("⚠️ Showing cached result — upstream unreachable")
 
                     # Display the API URL used
                     with st.expander("🔗 API Request Details"):
@@ -313,10 +502,9 @@ def main():
                         st.json(result["data"])
 
                         # Download button for JSON
-                        json_str = json.dumps(result["data"], indent=2)
                         st.download_button(
                             label="📥 Download JSON",
-                            data=json_str,
+                            data=result["download"],
                             file_name=f"citation_{result['format_type']}.json",
                             mime="application/json",
                         )
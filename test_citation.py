@@ -3,17 +3,27 @@ Simple test script to verify the citation fetcher functionality
 without requiring Streamlit to be installed
 """
 
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from urllib.parse import quote
 
+_CITOID_HEADERS = {"User-Agent": "Streamlit-Citation-Fetcher/1.0 (Educational Project)"}
+
+# Shared session so repeated calls reuse pooled connections
+SESSION = requests.Session()
+SESSION.headers.update(_CITOID_HEADERS)
+
 
-def fetch_citation(url, format_type="zotero"):
+def fetch_citation(url, format_type="zotero", session=None):
     """
     Fetch citation metadata from Citoid API
 
     Args:
         url: The URL to fetch citation data for
         format_type: Citation format (mediawiki, mediawiki-basefields, zotero, bibtex)
+        session: Optional requests.Session to use (defaults to the module SESSION)
 
     Returns:
         dict: Response from the API or error details
@@ -25,11 +35,8 @@ def fetch_citation(url, format_type="zotero"):
         # Build the API endpoint
         api_url = f"https://en.wikipedia.org/api/rest_v1/data/citation/{format_type}/{encoded_url}"
 
-        # Set headers with User-Agent
-        headers = {"User-Agent": "Streamlit-Citation-Fetcher/1.0 (Educational Project)"}
-
-        # Make the API call
-        response = requests.get(api_url, headers=headers, timeout=10)
+        # Make the API call (the session carries the User-Agent header)
+        response = (session or SESSION).get(api_url, timeout=10)
 
         # Raise exception for bad status codes
         response.raise_for_status()
@@ -67,7 +74,38 @@ def fetch_citation(url, format_type="zotero"):
         return {"success": False, "error": f"An unexpected error occurred: {str(e)}"}
 
 
-if __name__ == "__main__":
+def run_batch(urls, max_workers=8):
+    """
+    Fetch citations for several URLs concurrently over the shared session
+
+    Args:
+        urls: List of URLs to fetch citation data for
+        max_workers: Number of concurrent requests
+
+    Returns:
+        bool: True if every URL was fetched successfully
+    """
+    print(f"Testing {len(urls)} URL(s) with {max_workers} workers...")
+    print("-" * 50)
+
+    def _one(url):
+        return fetch_citation(url, "zotero", session=SESSION)
+
+    all_ok = True
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for url, result in zip(urls, executor.map(_one, urls)):
+            if result["success"]:
+                print(f"✓ {url}")
+            else:
+                all_ok = False
+                print(f"✗ {url}: {result['error']}")
+
+    print("-" * 50)
+    return all_ok
+
+
+def run_single():
+    """Run the original single-URL demo"""
     print("Testing Citation Fetcher...")
     print("-" * 50)
 
@@ -106,3 +144,11 @@ if __name__ == "__main__":
         print("\nNote: This might fail if there's no internet connection.")
 
     print("-" * 50)
+
+
+if __name__ == "__main__":
+    # With no arguments run the single-URL demo, otherwise test each URL given
+    if len(sys.argv) == 1:
+        run_single()
+    else:
+        sys.exit(0 if run_batch(sys.argv[1:]) else 1)